@@ -1,103 +1,367 @@
-import aiomysql
+import asyncmy
+from asyncmy.cursors import Cursor, DictCursor, SSDictCursor
+from .database import DB_CONFIG, get_db_pool
 from .models import TaskCreate, TaskUpdate, Task
-from typing import List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import asyncio
+from datetime import datetime
 import logging
+import msgspec
+import time
 
 logger = logging.getLogger(__name__)
 
-async def create_task(db: aiomysql.Connection, task: TaskCreate) -> Optional[Task]:
+# Columns update_task is allowed to write. Also keeps _UPDATE_SQL_CACHE bounded.
+_UPDATABLE_COLUMNS = frozenset({'title', 'description', 'status', 'due_date'})
+
+# Generated UPDATE statements, keyed by the sorted tuple of columns being set
+_UPDATE_SQL_CACHE: Dict[Tuple[str, ...], str] = {}
+
+def _update_sql(cols: Tuple[str, ...]) -> str:
+    """Returns the cached UPDATE + read-back batch for the given columns."""
+    query = _UPDATE_SQL_CACHE.get(cols)
+    if query is None:
+        set_clause = ", ".join([f"{col} = %s" for col in cols])
+        query = _UPDATE_SQL_CACHE.setdefault(cols, f"""
+            UPDATE tasks SET {set_clause} WHERE task_id = %s;
+            SELECT * FROM tasks WHERE task_id = %s
+        """)
+    return query
+
+# Read-through cache for get_task: task_id -> (expiry, Task), kept in LRU order.
+# Writes through this process invalidate their entry. The TTL bounds how
+# stale an entry can get when another worker process changes the row.
+_TASK_CACHE_MAXSIZE = 4096
+_TASK_CACHE_TTL = 60 # Seconds
+_task_cache: "OrderedDict[int, Tuple[float, Task]]" = OrderedDict()
+
+# get_task reads currently running, so concurrent misses share one SELECT
+_inflight: "Dict[int, asyncio.Future[Optional[Task]]]" = {}
+
+def _cache_get(task_id: int) -> Optional[Task]:
+    """Returns the cached task, or None if it is missing or expired."""
+    entry = _task_cache.get(task_id)
+    if entry is None:
+        return None
+    expires_at, task = entry
+    if expires_at < time.monotonic():
+        del _task_cache[task_id]
+        return None
+    _task_cache.move_to_end(task_id)
+    return task
+
+def _invalidate_task(task_id: int) -> None:
+    """Drops the cached task and detaches any in-flight read of it."""
+    _task_cache.pop(task_id, None)
+    _inflight.pop(task_id, None)
+
+def _forget_fetch(task_id: int, fetch: "asyncio.Future[Optional[Task]]") -> None:
+    """Removes a finished fetch, unless a newer one has replaced it."""
+    if _inflight.get(task_id) is fetch:
+        del _inflight[task_id]
+
+def _cache_put(task_id: int, task: Task) -> None:
+    """Caches a task, evicting the least recently used entry when full."""
+    _task_cache[task_id] = (time.monotonic() + _TASK_CACHE_TTL, task)
+    _task_cache.move_to_end(task_id)
+    if len(_task_cache) > _TASK_CACHE_MAXSIZE:
+        _task_cache.popitem(last=False)
+
+async def create_task(task: TaskCreate) -> Optional[Task]:
     """Creates a new task in the database."""
+    # INSERT and read-back are sent as one multi-statement batch, so the
+    # created row comes back in the same round-trip as the insert.
     query = """
         INSERT INTO tasks (title, description, status, due_date)
-        VALUES (%s, %s, %s, %s)
+        VALUES (%s, %s, %s, %s);
+        SELECT * FROM tasks WHERE task_id = LAST_INSERT_ID()
     """
     values = (task.title, task.description, task.status, task.due_date)
     try:
-        async with db.cursor() as cursor:
+        pool = await get_db_pool()
+        async with pool.acquire() as conn, conn.cursor(DictCursor) as cursor:
             await cursor.execute(query, values)
-            # await db.commit() # Not needed if autocommit=True in pool config
+            # await conn.commit() # Not needed if autocommit=True in pool config
             new_task_id = cursor.lastrowid
-            logger.info(f"Task created with ID: {new_task_id}")
-            return await get_task(db, new_task_id) # Fetch the created task
+            logger.info("Task created with ID: %s", new_task_id)
+            await cursor.nextset() # Move on to the SELECT result set
+            result = await cursor.fetchone()
+            return msgspec.convert(result, Task) if result else None # Validate the new row once
     except Exception as e:
-        logger.error(f"Error creating task: {e}")
-        # await db.rollback() # Rollback might be needed if autocommit=False
+        logger.error("Error creating task: %s", e)
+        # await conn.rollback() # Rollback might be needed if autocommit=False
         return None
 
-async def get_task(db: aiomysql.Connection, task_id: int) -> Optional[Task]:
+async def create_tasks_bulk(tasks: List[TaskCreate]) -> Optional[List[Task]]:
+    """Creates several tasks with a single multi-row INSERT."""
+    # One INSERT with a VALUES row per task, followed by the read-back, all in
+    # one batch. LAST_INSERT_ID() is the ID of the first row of a multi-row
+    # INSERT, and the statement's rows follow it @@auto_increment_increment
+    # apart. The read-back is bounded to exactly those n slots, so rows that
+    # other primaries insert in between (with a different offset) are skipped.
+    # (cursor.executemany would split large batches into several INSERTs,
+    # leaving lastrowid pointing at the last chunk only.)
+    placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(tasks))
+    query = f"""
+        INSERT INTO tasks (title, description, status, due_date)
+        VALUES {placeholders};
+        SELECT * FROM tasks
+        WHERE task_id BETWEEN LAST_INSERT_ID()
+            AND LAST_INSERT_ID() + (%s - 1) * @@auto_increment_increment
+        AND (task_id - LAST_INSERT_ID()) %% @@auto_increment_increment = 0
+        ORDER BY task_id
+    """
+    values = [v for t in tasks for v in (t.title, t.description, t.status, t.due_date)]
+    values.append(len(tasks))
+    try:
+        pool = await get_db_pool()
+        async with pool.acquire() as conn, conn.cursor(DictCursor) as cursor:
+            await cursor.execute(query, tuple(values))
+            first_task_id = cursor.lastrowid
+            logger.info("%s tasks created starting at ID: %s", len(tasks), first_task_id)
+            await cursor.nextset() # Move on to the SELECT result set
+            results = await cursor.fetchall()
+            if len(results) != len(tasks):
+                logger.error(
+                    "Bulk insert read back %s rows for %s tasks starting at ID: %s",
+                    len(results), len(tasks), first_task_id,
+                )
+                return None
+            return msgspec.convert(results, List[Task])
+    except Exception as e:
+        logger.error("Error creating tasks: %s", e)
+        return None
+
+async def get_task(task_id: int) -> Optional[Task]:
     """Retrieves a single task by its ID."""
-    query = "SELECT * FROM tasks WHERE task_id = %s"
+    cached = _cache_get(task_id)
+    if cached is not None:
+        return cached
+
+    # Concurrent misses for the same ID share one in-flight SELECT. The fetch
+    # is shielded so a cancelled caller doesn't cancel it for the others.
+    fetch = _inflight.get(task_id)
+    if fetch is None:
+        fetch = asyncio.ensure_future(_fetch_task(task_id))
+        _inflight[task_id] = fetch
+        fetch.add_done_callback(lambda done: _forget_fetch(task_id, done))
+    return await asyncio.shield(fetch)
+
+async def _fetch_task(task_id: int) -> Optional[Task]:
+    """Runs the SELECT behind get_task and caches a hit."""
     try:
-        async with db.cursor(aiomysql.DictCursor) as cursor: # Ensure DictCursor here too
-            await cursor.execute(query, (task_id,))
+        pool = await get_db_pool()
+        async with pool.acquire() as conn, conn.cursor(Cursor) as cursor: # Pool default is DictCursor
+            await cursor.execute(_GET_TASK_QUERY, (task_id,))
             result = await cursor.fetchone()
             if result:
-                return Task(**result)
-            return None
+                # Rows come from the typed tasks table, so skip re-validation.
+                # Explicit columns keep this working if the table gains new ones.
+                task = Task(*result)
+                # If a write invalidated this ID mid-flight, the row may be stale
+                if _inflight.get(task_id) is asyncio.current_task():
+                    _cache_put(task_id, task)
+                return task
+            return None # Misses are not cached
     except Exception as e:
-        logger.error(f"Error retrieving task {task_id}: {e}")
+        logger.error("Error retrieving task %s: %s", task_id, e)
         return None
 
-async def get_tasks(db: aiomysql.Connection, skip: int = 0, limit: int = 100) -> List[Task]:
-    """Retrieves a list of tasks with pagination."""
-    query = "SELECT * FROM tasks ORDER BY created_at DESC LIMIT %s OFFSET %s"
-    tasks = []
+# Read queries name their columns in Task's field order, so rows can be
+# passed to Task positionally from a plain tuple cursor.
+_TASK_LIST_COLUMNS = "task_id, title, description, status, due_date, created_at, updated_at"
+_GET_TASK_QUERY = f"SELECT {_TASK_LIST_COLUMNS} FROM tasks WHERE task_id = %s"
+
+# Keyset pagination: pages are ordered by (created_at, task_id) and each page
+# seeks past the last row of the previous one via idx_tasks_created_at_id,
+# instead of scanning and discarding OFFSET rows.
+_FIRST_PAGE_QUERY = f"""
+    SELECT {_TASK_LIST_COLUMNS} FROM tasks
+    ORDER BY created_at DESC, task_id DESC LIMIT %s
+"""
+_NEXT_PAGE_QUERY = f"""
+    SELECT {_TASK_LIST_COLUMNS} FROM tasks
+    WHERE (created_at, task_id) < (%s, %s)
+    ORDER BY created_at DESC, task_id DESC LIMIT %s
+"""
+
+def _page_query(
+    limit: int, cursor_created_at: Optional[datetime], cursor_task_id: Optional[int]
+) -> Tuple[str, tuple]:
+    """Picks the first-page or next-page query and its parameters."""
+    if cursor_created_at is None or cursor_task_id is None:
+        return _FIRST_PAGE_QUERY, (limit,)
+    return _NEXT_PAGE_QUERY, (cursor_created_at, cursor_task_id, limit)
+
+async def get_tasks(
+    limit: int = 100,
+    cursor_created_at: Optional[datetime] = None,
+    cursor_task_id: Optional[int] = None,
+) -> List[Task]:
+    """Retrieves a page of tasks, newest first, starting after the given cursor."""
+    query, values = _page_query(limit, cursor_created_at, cursor_task_id)
     try:
-        async with db.cursor(aiomysql.DictCursor) as cursor:
-            await cursor.execute(query, (limit, skip))
+        pool = await get_db_pool()
+        async with pool.acquire() as conn, conn.cursor(Cursor) as cursor: # Pool default is DictCursor
+            await cursor.execute(query, values)
             results = await cursor.fetchall()
-            for row in results:
-                tasks.append(Task(**row))
-            return tasks
+            return [Task(*r) for r in results] # Column order matches Task's fields
     except Exception as e:
-        logger.error(f"Error retrieving tasks: {e}")
+        logger.error("Error retrieving tasks: %s", e)
         return []
 
-async def update_task(db: aiomysql.Connection, task_id: int, task_update: TaskUpdate) -> Optional[Task]:
-    """Updates an existing task."""
-    # Fetch existing task first to make sure it exists
-    existing_task = await get_task(db, task_id)
-    if not existing_task:
-        return None # Task not found
+async def get_tasks_raw(
+    limit: int = 100,
+    cursor_created_at: Optional[datetime] = None,
+    cursor_task_id: Optional[int] = None,
+) -> Sequence[dict]:
+    """Same page as get_tasks, but as plain row dicts with no Task models."""
+    query, values = _page_query(limit, cursor_created_at, cursor_task_id)
+    try:
+        pool = await get_db_pool()
+        async with pool.acquire() as conn, conn.cursor(DictCursor) as cursor:
+            await cursor.execute(query, values)
+            return await cursor.fetchall()
+    except Exception as e:
+        logger.error("Error retrieving raw tasks: %s", e)
+        return ()
+
+# Rows pulled from the server per fetch while streaming an export
+_EXPORT_CHUNK_SIZE = 500
+
+# An export's connection stays open for as long as the client takes to read
+# the stream, so exports use their own connections instead of pool slots
+# (slow clients would otherwise starve every other endpoint). They are also
+# capped, so they can't use up the server's max_connections either.
+MAX_CONCURRENT_EXPORTS = 4
+_active_exports = 0
+
+def try_acquire_export_slot() -> Optional[Callable[[], None]]:
+    """Claims an export slot without waiting.
+
+    Returns a function that releases the slot (safe to call more than once),
+    or None if every slot is taken.
+    """
+    global _active_exports
+    if _active_exports >= MAX_CONCURRENT_EXPORTS:
+        return None
+    _active_exports += 1
+    released = False
+
+    def release() -> None:
+        global _active_exports
+        nonlocal released
+        if not released:
+            released = True
+            _active_exports -= 1
 
-    # Build the update query dynamically based on provided fields
-    update_data = task_update.model_dump(exclude_unset=True) # Get only fields that were provided
-    if not update_data:
-        return existing_task # No changes provided, return existing task
+    return release
 
-    set_clause = ", ".join([f"{key} = %s" for key in update_data.keys()])
-    query = f"UPDATE tasks SET {set_clause} WHERE task_id = %s"
-    values = list(update_data.values()) + [task_id]
+async def stream_tasks() -> AsyncIterator[dict]:
+    """Yields every task as a row dict, streamed from the server.
 
+    Callers must hold a slot from try_acquire_export_slot while iterating.
+    """
+    # SSDictCursor is unbuffered: rows are read off the socket as they are
+    # fetched instead of the whole result set being loaded into memory first.
+    # It is slower than the buffered cursor for small results, so only the
+    # export uses it.
+    query = f"SELECT {_TASK_LIST_COLUMNS} FROM tasks ORDER BY task_id"
+    conn = None
+    finished = False
     try:
-        async with db.cursor() as cursor:
-            await cursor.execute(query, tuple(values))
-            # await db.commit() # Not needed if autocommit=True
+        conn = await asyncmy.connect(**DB_CONFIG)
+        cursor = conn.cursor(SSDictCursor)
+        await cursor.execute(query)
+        while True:
+            rows = await cursor.fetchmany(_EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+        finished = True
+        await cursor.close()
+    except Exception as e:
+        # Headers are already sent by the time this runs, so the export just ends early
+        logger.error("Error streaming tasks: %s", e)
+    finally:
+        # Closing an unbuffered cursor early reads the rest of the result
+        # off the socket, so a client that disconnects mid-export would
+        # still pull the whole table. Drop the connection instead.
+        if conn is not None:
+            if finished:
+                await conn.ensure_closed()
+            else:
+                conn.close()
+
+class TaskNotFound(LookupError):
+    """Raised by update_task when no task has the given ID."""
+
+async def update_task(task_id: int, task_update: TaskUpdate) -> Optional[Task]:
+    """Updates an existing task. Raises TaskNotFound if it doesn't exist, returns None on errors."""
+    fields = task_update.model_fields_set # Only fields that were provided
+    if not fields:
+        # No changes provided, return existing task
+        existing_task = await get_task(task_id)
+        if existing_task is None:
+            raise TaskNotFound(task_id)
+        return existing_task
+
+    cols = tuple(sorted(fields))
+    if not _UPDATABLE_COLUMNS.issuperset(cols):
+        logger.error("Refusing to update unknown columns for task %s: %s", task_id, cols)
+        return None
+
+    # UPDATE and read-back are sent as one multi-statement batch. With
+    # CLIENT.FOUND_ROWS set, rowcount counts matched rather than changed rows,
+    # so 0 means the task doesn't exist (not that the values were unchanged).
+    query = _update_sql(cols)
+    values = [getattr(task_update, col) for col in cols] + [task_id, task_id]
+
+    try:
+        pool = await get_db_pool()
+        async with pool.acquire() as conn, conn.cursor(DictCursor) as cursor:
+            try:
+                await cursor.execute(query, tuple(values))
+                # await conn.commit() # Not needed if autocommit=True
+            finally:
+                # Even if execute fails, the UPDATE may already have committed
+                _invalidate_task(task_id)
             if cursor.rowcount == 0:
-                 logger.warning(f"Update attempted but no rows affected for task_id: {task_id}")
-                 # This might happen in a race condition, refetch or return None/existing
-                 return await get_task(db, task_id) # Re-fetch to be safe
-            logger.info(f"Task {task_id} updated successfully.")
-            return await get_task(db, task_id) # Fetch the updated task
+                raise TaskNotFound(task_id) # Closing the cursor discards the empty SELECT
+            await cursor.nextset() # Move on to the SELECT result set
+            result = await cursor.fetchone()
+            if not result:
+                raise TaskNotFound(task_id) # Deleted concurrently, between the UPDATE and the SELECT
+            logger.info("Task %s updated successfully.", task_id)
+            return msgspec.convert(result, Task)
+    except TaskNotFound:
+        raise
     except Exception as e:
-        logger.error(f"Error updating task {task_id}: {e}")
-        # await db.rollback() # Consider rollback if autocommit=False
+        logger.error("Error updating task %s: %s", task_id, e)
+        # await conn.rollback() # Consider rollback if autocommit=False
         return None
 
-async def delete_task(db: aiomysql.Connection, task_id: int) -> bool:
+async def delete_task(task_id: int) -> bool:
     """Deletes a task by its ID."""
     query = "DELETE FROM tasks WHERE task_id = %s"
     try:
-        async with db.cursor() as cursor:
-            await cursor.execute(query, (task_id,))
-            # await db.commit() # Not needed if autocommit=True
+        pool = await get_db_pool()
+        async with pool.acquire() as conn, conn.cursor() as cursor:
+            try:
+                await cursor.execute(query, (task_id,))
+                # await conn.commit() # Not needed if autocommit=True
+            finally:
+                # Even if execute fails, the DELETE may already have committed
+                _invalidate_task(task_id)
             if cursor.rowcount > 0:
-                logger.info(f"Task {task_id} deleted successfully.")
+                logger.info("Task %s deleted successfully.", task_id)
                 return True
             else:
-                logger.warning(f"Delete attempted but task_id {task_id} not found.")
+                logger.warning("Delete attempted but task_id %s not found.", task_id)
                 return False # Task not found
     except Exception as e:
-        logger.error(f"Error deleting task {task_id}: {e}")
-        # await db.rollback() # Consider rollback if autocommit=False
+        logger.error("Error deleting task %s: %s", task_id, e)
+        # await conn.rollback() # Consider rollback if autocommit=False
         return False
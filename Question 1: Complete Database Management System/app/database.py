@@ -1,38 +1,55 @@
-import aiomysql
+import asyncmy
+from asyncmy.connection import Connection
+from asyncmy.constants import CLIENT
+from asyncmy.cursors import DictCursor
 import os
 from dotenv import load_dotenv
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Database configuration
 DB_CONFIG = {
     'host': os.getenv('MYSQL_HOST', 'localhost'),
     'port': int(os.getenv('MYSQL_PORT', 3306)),
     'user': os.getenv('MYSQL_USER'),
     'password': os.getenv('MYSQL_PASSWORD'),
-    'db': os.getenv('MYSQL_DB'),
+    'database': os.getenv('MYSQL_DB'),
+    'charset': 'utf8mb4', # Pinned once per connection, matches the tables
+    'use_unicode': True,
+    # Session settings applied once when each pooled connection is opened
+    # Adds STRICT_ALL_TABLES to the server's sql_mode rather than replacing it
+    'init_command': "SET SESSION sql_mode=CONCAT(@@sql_mode, ',STRICT_ALL_TABLES'), time_zone='+00:00'",
+    'connect_timeout': 5, # Fail fast instead of hanging startup on an unreachable server
     'autocommit': True, # Important for CRUD operations without explicit commit
-    'cursorclass': aiomysql.DictCursor # Return rows as dictionaries
+    'cursor_cls': DictCursor, # Return rows as dictionaries
+    # MULTI_STATEMENTS lets crud send a write and its read-back in one round-trip.
+    # FOUND_ROWS makes UPDATE's rowcount report matched rows, not changed rows.
+    'client_flag': CLIENT.MULTI_STATEMENTS | CLIENT.FOUND_ROWS
 }
 
+# Pool is preallocated (minsize == maxsize) so requests never wait on a new
+# connection handshake. Tune with MYSQL_POOL_SIZE.
+POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', 10))
+POOL_RECYCLE = 3600 # Seconds before an idle connection is reopened
+
 pool = None
 
 async def get_db_pool():
-    """Creates and returns an aiomysql connection pool."""
+    """Creates and returns an asyncmy connection pool."""
     global pool
     if pool is None:
-        logger.info(f"Creating database connection pool for {DB_CONFIG['db']} on {DB_CONFIG['host']}")
+        logger.info("Creating database connection pool for %s on %s", DB_CONFIG['database'], DB_CONFIG['host'])
         try:
-            pool = await aiomysql.create_pool(**DB_CONFIG, minsize=1, maxsize=10)
+            pool = await asyncmy.create_pool(
+                **DB_CONFIG, minsize=POOL_SIZE, maxsize=POOL_SIZE, pool_recycle=POOL_RECYCLE
+            )
             logger.info("Database connection pool created successfully.")
         except Exception as e:
-            logger.error(f"Failed to create database connection pool: {e}")
+            logger.error("Failed to create database connection pool: %s", e)
             raise # Re-raise the exception to halt startup if connection fails
     return pool
 
@@ -51,7 +68,18 @@ async def get_db_connection():
     async with db_pool.acquire() as conn:
         yield conn # Provide the connection to the route
 
-async def get_db_cursor(conn: aiomysql.Connection):
+async def get_db_cursor(conn: Connection):
      """ Utility to get a cursor from a connection """
      async with conn.cursor() as cursor:
          yield cursor
+
+async def ping_db() -> bool:
+    """ Runs SELECT 1 on a pooled connection to confirm the database is reachable """
+    try:
+        db_pool = await get_db_pool()
+        async with db_pool.acquire() as conn, conn.cursor() as cursor:
+            await cursor.execute("SELECT 1")
+        return True
+    except Exception as e:
+        logger.error("Database readiness check failed: %s", e)
+        return False
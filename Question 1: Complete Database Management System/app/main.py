@@ -1,12 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
-from typing import List, Optional
-import aiomysql # Import necessary library
+from fastapi import FastAPI, Body, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
+from typing import Callable, List, Optional
+from contextlib import AsyncExitStack
+from datetime import datetime
 import logging
+import msgspec
+import os
+import orjson
 
 from . import crud, models, database
 
-# Configure logging (optional but recommended)
-logging.basicConfig(level=logging.INFO)
+# Configure logging (optional but recommended). Set LOG_LEVEL=WARNING in
+# production to drop the per-request INFO lines; unknown names fall back to INFO.
+log_level = logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+logging.basicConfig(level=log_level if isinstance(log_level, int) else logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app instance
@@ -16,23 +23,66 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# --- Dependency ---
-# This dependency ensures we get a connection for each request
-# that needs one. The connection is automatically released.
-async def get_db():
-    pool = await database.get_db_pool()
-    async with pool.acquire() as connection:
+# Upper bound on POST /tasks/batch so one request stays a reasonably sized INSERT
+MAX_BATCH_SIZE = 100
+
+# Task responses are msgspec Structs, which FastAPI can't serialize itself,
+# so endpoints encode them directly and return the finished Response.
+def msgspec_response(content, status_code: int = status.HTTP_200_OK) -> Response:
+    return Response(content=msgspec.json.encode(content), status_code=status_code, media_type="application/json")
+
+# Without response_model, FastAPI has no schema for these responses, so the
+# docs get JSON schemas generated by msgspec instead. Struct definitions go
+# into the OpenAPI components and are referenced from each endpoint.
+(TASK_SCHEMA, TASK_LIST_SCHEMA, TASK_PAGE_SCHEMA), MSGSPEC_COMPONENTS = msgspec.json.schema_components(
+    [models.Task, List[models.Task], models.TaskPage], ref_template="#/components/schemas/{name}"
+)
+
+def msgspec_responses(schema: dict, status_code: int = status.HTTP_200_OK) -> dict:
+    """Builds the `responses=` entry documenting a msgspec-encoded body."""
+    return {status_code: {"content": {"application/json": {"schema": schema}}}}
+
+_default_openapi = app.openapi
+
+def openapi_with_msgspec_components() -> dict:
+    if app.openapi_schema is None:
+        schema = _default_openapi()
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(MSGSPEC_COMPONENTS)
+    return app.openapi_schema
+
+app.openapi = openapi_with_msgspec_components
+
+# Shared by the paged list endpoints: a cursor needs both of its halves
+def check_page_cursor(cursor_created_at: Optional[datetime], cursor_task_id: Optional[int]) -> None:
+    if (cursor_created_at is None) != (cursor_task_id is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="cursor_created_at and cursor_task_id must be given together")
+
+class ExportResponse(StreamingResponse):
+    """
+    StreamingResponse that also frees its export slot once the response ends.
+    Covers streams cancelled before the body generator ever starts, whose
+    `finally` would then never run.
+    """
+    def __init__(self, content, release_slot: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release_slot = release_slot
+
+    async def __call__(self, scope, receive, send):
         try:
-            yield connection
+            await super().__call__(scope, receive, send)
         finally:
-            # The connection is automatically released back to the pool
-            pass
+            self.release_slot()
 
 # --- Event Handlers ---
 @app.on_event("startup")
 async def startup_event():
     logger.info("Application startup...")
-    await database.get_db_pool() # Initialize pool on startup
+    pool = await database.get_db_pool() # Initialize pool on startup
+    # Check out every connection once so they are all open before serving traffic
+    async with AsyncExitStack() as stack:
+        for _ in range(pool.maxsize):
+            connection = await stack.enter_async_context(pool.acquire())
+            await connection.ping()
     logger.info("Database pool initialized.")
 
 
@@ -46,8 +96,8 @@ async def shutdown_event():
 # --- API Endpoints ---
 
 # CREATE Task
-@app.post("/tasks/", response_model=models.Task, status_code=status.HTTP_201_CREATED, summary="Create a new task")
-async def create_new_task(task: models.TaskCreate, db: aiomysql.Connection = Depends(get_db)):
+@app.post("/tasks/", status_code=status.HTTP_201_CREATED, responses=msgspec_responses(TASK_SCHEMA, status.HTTP_201_CREATED), summary="Create a new task")
+async def create_new_task(task: models.TaskCreate):
     """
     Creates a new task with the provided details.
     - **title**: The mandatory title of the task.
@@ -55,66 +105,145 @@ async def create_new_task(task: models.TaskCreate, db: aiomysql.Connection = Dep
     - **status**: Status ('pending', 'in_progress', 'completed'), defaults to 'pending'.
     - **due_date**: Optional due date in YYYY-MM-DD format.
     """
-    created_task = await crud.create_task(db=db, task=task)
+    created_task = await crud.create_task(task=task)
     if created_task is None:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not create task")
-    return created_task
+    return msgspec_response(created_task, status_code=status.HTTP_201_CREATED)
+
+# CREATE Tasks in bulk
+@app.post("/tasks/batch", status_code=status.HTTP_201_CREATED, responses=msgspec_responses(TASK_LIST_SCHEMA, status.HTTP_201_CREATED), summary="Create several tasks at once")
+async def create_new_tasks(
+    tasks: List[models.TaskCreate] = Body(..., min_length=1, max_length=MAX_BATCH_SIZE)
+):
+    """
+    Creates up to 100 tasks in a single database round-trip.
+    Each item takes the same fields as `POST /tasks/`.
+    """
+    created_tasks = await crud.create_tasks_bulk(tasks=tasks)
+    if created_tasks is None:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not create tasks")
+    return msgspec_response(created_tasks, status_code=status.HTTP_201_CREATED)
 
 # READ All Tasks (with optional filtering and pagination)
-@app.get("/tasks/", response_model=List[models.Task], summary="Retrieve multiple tasks")
+@app.get("/tasks/", responses=msgspec_responses(TASK_PAGE_SCHEMA), summary="Retrieve multiple tasks")
 async def read_tasks(
-    skip: int = Query(0, ge=0, description="Number of tasks to skip"),
-    limit: int = Query(100, ge=1, le=200, description="Maximum number of tasks to return"),
-    db: aiomysql.Connection = Depends(get_db)
+    cursor_created_at: Optional[datetime] = Query(None, description="created_at from the previous page's next_cursor"),
+    cursor_task_id: Optional[int] = Query(None, description="task_id from the previous page's next_cursor"),
+    limit: int = Query(100, ge=1, le=200, description="Maximum number of tasks to return")
 ):
     """
-    Retrieves a list of tasks, supporting pagination.
+    Retrieves a page of tasks, newest first.
+    Pass both values from the previous page's `next_cursor` to fetch the next page.
     """
-    tasks = await crud.get_tasks(db=db, skip=skip, limit=limit)
-    return tasks
+    check_page_cursor(cursor_created_at, cursor_task_id)
+    tasks = await crud.get_tasks(limit=limit, cursor_created_at=cursor_created_at, cursor_task_id=cursor_task_id)
+    next_cursor = None
+    if len(tasks) == limit: # A short page means there is nothing left to fetch
+        last = tasks[-1]
+        next_cursor = models.TaskCursor(created_at=last.created_at, task_id=last.task_id)
+    return msgspec_response(models.TaskPage(tasks=tasks, next_cursor=next_cursor))
+
+# READ All Tasks, serialized straight from the database rows
+@app.get("/tasks/raw", responses=msgspec_responses(TASK_LIST_SCHEMA), summary="Retrieve multiple tasks (fast path)")
+async def read_tasks_raw(
+    cursor_created_at: Optional[datetime] = Query(None, description="created_at of the last task on the previous page"),
+    cursor_task_id: Optional[int] = Query(None, description="task_id of the last task on the previous page"),
+    limit: int = Query(100, ge=1, le=200, description="Maximum number of tasks to return")
+):
+    """
+    Same tasks as `GET /tasks/`, returned as a bare JSON list.
+    Rows are encoded with orjson directly, without building Task structs.
+    """
+    check_page_cursor(cursor_created_at, cursor_task_id)
+    rows = await crud.get_tasks_raw(limit=limit, cursor_created_at=cursor_created_at, cursor_task_id=cursor_task_id)
+    return Response(content=orjson.dumps(rows), media_type="application/json")
+
+# EXPORT All Tasks as newline-delimited JSON
+@app.get("/tasks/export", summary="Export all tasks as NDJSON")
+async def export_tasks():
+    """
+    Streams every task as one JSON object per line (`application/x-ndjson`).
+    Rows are sent as they are read, so memory use does not grow with the table.
+    Returns 503 if too many exports are already running.
+    """
+    # Claimed before any headers go out, so a burst of exports past the cap
+    # gets 503s rather than 200s that then wait on a slot
+    release_slot = crud.try_acquire_export_slot()
+    if release_slot is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many exports in progress, try again later",
+            headers={"Retry-After": "30"},
+        )
+
+    async def ndjson_lines():
+        try:
+            async for row in crud.stream_tasks():
+                yield orjson.dumps(row) + b"\n"
+        finally:
+            release_slot() # After stream_tasks has closed its connection
+
+    return ExportResponse(ndjson_lines(), release_slot, media_type="application/x-ndjson")
 
 # READ Single Task
-@app.get("/tasks/{task_id}", response_model=models.Task, summary="Retrieve a single task by ID")
-async def read_task(task_id: int, db: aiomysql.Connection = Depends(get_db)):
+@app.get("/tasks/{task_id}", responses=msgspec_responses(TASK_SCHEMA), summary="Retrieve a single task by ID")
+async def read_task(task_id: int):
     """
     Retrieves the details of a specific task by its unique ID.
     """
-    db_task = await crud.get_task(db=db, task_id=task_id)
+    db_task = await crud.get_task(task_id=task_id)
     if db_task is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-    return db_task
+    return msgspec_response(db_task)
 
 # UPDATE Task
-@app.put("/tasks/{task_id}", response_model=models.Task, summary="Update an existing task")
-async def update_existing_task(task_id: int, task: models.TaskUpdate, db: aiomysql.Connection = Depends(get_db)):
+@app.put("/tasks/{task_id}", responses=msgspec_responses(TASK_SCHEMA), summary="Update an existing task")
+async def update_existing_task(task_id: int, task: models.TaskUpdate):
     """
     Updates the details of an existing task. Provide only the fields you want to change.
     """
-    updated_task = await crud.update_task(db=db, task_id=task_id, task_update=task)
+    try:
+        updated_task = await crud.update_task(task_id=task_id, task_update=task)
+    except crud.TaskNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
     if updated_task is None:
-        # Distinguish between not found and other update errors if needed
-        # Check if the task existed before update attempt if crud doesn't return None on success
-        existing = await crud.get_task(db=db, task_id=task_id)
-        if existing is None:
-             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-        else:
-             # If task exists but update failed for other reason (rare with this setup)
-             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not update task")
-    return updated_task
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not update task")
+    return msgspec_response(updated_task)
 
 # DELETE Task
 @app.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete a task")
-async def delete_existing_task(task_id: int, db: aiomysql.Connection = Depends(get_db)):
+async def delete_existing_task(task_id: int):
     """
     Deletes a specific task by its unique ID. Returns 204 No Content on success.
     """
-    success = await crud.delete_task(db=db, task_id=task_id)
+    success = await crud.delete_task(task_id=task_id)
     if not success:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
     # No content to return on successful delete
     return None # FastAPI handles the 204 response code correctly here
 
-# Health Check Endpoint (Optional)
+# Health Check Endpoint (liveness)
+# Only inspects pool counters, never acquires a connection, so frequent
+# probes can't starve request handlers of pool slots.
 @app.get("/health", status_code=status.HTTP_200_OK, summary="Health check endpoint")
 async def health_check():
-    return {"status": "healthy"}
+    pool = database.pool
+    if pool is None:
+        return {"status": "healthy", "pool_size": 0, "pool_free": 0}
+    return {"status": "healthy", "pool_size": pool.size, "pool_free": pool.freesize}
+
+# Readiness Check Endpoint
+@app.get("/ready", status_code=status.HTTP_200_OK, summary="Readiness check endpoint")
+async def readiness_check():
+    """
+    Confirms the database answers a `SELECT 1`. Use for readiness probes; use `/health` for liveness.
+    """
+    if not await database.ping_db():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database unavailable")
+    return {"status": "ready"}
+
+
+# Allows running with `python -m app.main` as well as the uvicorn CLI
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("app.main:app", loop="auto") # Uses uvloop where it is installed
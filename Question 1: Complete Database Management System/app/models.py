@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Literal
+import msgspec
+from typing import List, Optional, Literal
 from datetime import date, datetime
 
 # Define possible task statuses
@@ -30,10 +31,25 @@ class TaskUpdate(BaseModel):
     due_date: Optional[date] = Field(None, description="The date the task is due")
 
 
-class Task(TaskBase):
-    task_id: int = Field(..., description="The unique identifier for the task")
-    created_at: datetime = Field(..., description="Timestamp when the task was created")
-    updated_at: datetime = Field(..., description="Timestamp when the task was last updated")
+# Output shapes are msgspec Structs rather than Pydantic models: they are much
+# cheaper to construct and encode, which matters for list responses. Input is
+# still validated by the Pydantic models above. Field order follows the
+# columns selected in crud, so rows can be passed positionally.
+class Task(msgspec.Struct, frozen=True):
+    task_id: int # The unique identifier for the task
+    title: str
+    description: Optional[str]
+    status: TaskStatus
+    due_date: Optional[date]
+    created_at: datetime # Timestamp when the task was created
+    updated_at: datetime # Timestamp when the task was last updated
 
-    class Config:
-        from_attributes = True # Pydantic V2 uses this instead of orm_mode
+
+class TaskCursor(msgspec.Struct, frozen=True):
+    created_at: datetime # created_at of the last task on the previous page
+    task_id: int # task_id of the last task on the previous page
+
+
+class TaskPage(msgspec.Struct):
+    tasks: List[Task] # The tasks on this page, newest first
+    next_cursor: Optional[TaskCursor] = None # Cursor for the next page, or None on the last page
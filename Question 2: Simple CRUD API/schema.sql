@@ -1 +1,17 @@
+-- Task Manager API Database Schema
 
+-- -----------------------------------------------------
+-- Table `tasks`
+-- Stores the tasks managed through the API.
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `tasks` (
+  `task_id` INT AUTO_INCREMENT PRIMARY KEY,
+  `title` VARCHAR(255) NOT NULL,
+  `description` TEXT NULL,
+  `status` ENUM('pending', 'in_progress', 'completed') NOT NULL DEFAULT 'pending',
+  `due_date` DATE NULL,
+  `created_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  -- Supports keyset pagination in GET /tasks/ (newest first)
+  INDEX `idx_tasks_created_at_id` (`created_at` DESC, `task_id` DESC)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Stores tasks for the Task Manager API';